@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Benchmark the throughput/size trade-off of each ENEX output compression level."""
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from keep_to_notes import KeepToNotesConverter, open_compressed, zstandard
+
+# Levels worth comparing for each compressor
+LEVELS = {
+    'gzip': [1, 6, 9],
+    'xz': [0, 3, 6, 9],
+    'zstd': [1, 3, 9, 19],
+}
+
+
+def _sample_notes(count):
+    """Generate a mix of text and list notes resembling a Keep export."""
+    colors = ['DEFAULT', 'RED', 'YELLOW', 'GREEN', 'BLUE', 'GRAY']
+    notes = []
+    for i in range(count):
+        note = {
+            "title": f"Note {i}",
+            "color": colors[i % len(colors)],
+            "createdTimestampUsec": 1582955199253000 + i,
+            "userEditedTimestampUsec": 1582955199253000 + i,
+        }
+        if i % 3 == 0:
+            note["listContent"] = [
+                {"text": item, "isChecked": bool(j % 2)}
+                for j, item in enumerate(["milk", "eggs", "bread", f"item {i}"])
+            ]
+        else:
+            note["textContent"] = f"Note body {i} with a link https://example.com/{i} #tag{i % 10}"
+        notes.append(note)
+    return notes
+
+
+def _load_notes(input_dir):
+    """Load every Keep JSON file from a directory."""
+    notes = []
+    for json_file in sorted(Path(input_dir).glob('*.json')):
+        with open(json_file, 'r', encoding='utf-8') as f:
+            notes.append(json.load(f))
+    return notes
+
+
+def run_benchmark(keep_notes):
+    """Write the converted notes once per format and level, returning result rows."""
+    converter = KeepToNotesConverter()
+    enex_notes = [converter.convert_note(note) for note in keep_notes]
+    export_date = datetime.now().strftime("%Y%m%dT%H%M%SZ")
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        candidates = [(None, None)]
+        for compress, levels in LEVELS.items():
+            if compress == 'zstd' and zstandard is None:
+                logging.warning("Skipping zstd: the 'zstandard' package is not installed")
+                continue
+            candidates.extend((compress, level) for level in levels)
+
+        for compress, level in candidates:
+            output_file = Path(tmp_dir) / f"bench_{compress}_{level}.enex"
+            start = time.perf_counter()
+            converter.get_backend('enex').write_file(output_file, enex_notes, export_date, compress, level)
+            elapsed = time.perf_counter() - start
+            results.append((compress or 'none', level, os.path.getsize(output_file), elapsed))
+
+            # Make sure the output decompresses back to the original ENEX
+            with open_compressed(output_file, 'rt', compress) as f:
+                f.read()
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark compressed ENEX output')
+    parser.add_argument('--input-dir', help='Directory of Keep JSON files (synthetic notes if omitted)')
+    parser.add_argument('--notes', type=int, default=5000, help='Number of synthetic notes to generate')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    keep_notes = _load_notes(args.input_dir) if args.input_dir else _sample_notes(args.notes)
+    results = run_benchmark(keep_notes)
+
+    raw_size = results[0][2]
+    print(f"{'format':<8}{'level':>6}{'size (KB)':>12}{'ratio':>8}{'MB/s':>10}")
+    for compress, level, size, elapsed in results:
+        throughput = raw_size / (1024 * 1024) / elapsed if elapsed else float('inf')
+        level_str = '-' if level is None else str(level)
+        print(f"{compress:<8}{level_str:>6}{size / 1024:>12.1f}{raw_size / size:>8.1f}{throughput:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,34 +9,309 @@ import logging
 from pathlib import Path
 import re
 import hashlib
+import gzip
+import io
+import lzma
+import sys
+import tarfile
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from html import escape
+from urllib.parse import quote
+from lxml import etree, html as lxml_html
+
+try:
+    import zstandard
+except ImportError:  # Optional, only needed for zstd compression
+    zstandard = None
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# File suffixes used for each supported compression format
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+    'xz': '.xz',
+}
+
+# Valid (min, max) compression levels for each format
+COMPRESSION_LEVELS = {
+    'gzip': (0, 9),
+    'zstd': (1, 22),
+    'xz': (0, 9),
+}
+
+# Fields present in every Keep note export; used to skip other Takeout JSON files
+KEEP_NOTE_FIELDS = ('textContent', 'textContentHtml', 'listContent', 'isTrashed',
+                    'createdTimestampUsec', 'userEditedTimestampUsec')
+
+# Line starts that Markdown would read as a heading, quote, list or rule
+MARKDOWN_BLOCK_START = re.compile(r'^(\s*)(?:([#>+*\-=_~])|(\d+)([.)])(?=\s|$))')
+
+# Suffixes of tarballs that may contain a Keep export
+TARBALL_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.xz', '.txz', '.tar.bz2', '.tbz2')
+
+
+def open_compressed(path, mode, compress=None, level=None):
+    """Open a file, transparently (de)compressing it as a stream.
+
+    Text modes use UTF-8; binary modes ('rb'/'wb') return the raw byte stream.
+    """
+    encoding = {} if 'b' in mode else {'encoding': 'utf-8'}
+    if compress is None:
+        return open(path, mode, **encoding)
+    if compress == 'gzip':
+        kwargs = {} if level is None or 'r' in mode else {'compresslevel': level}
+        return gzip.open(path, mode, **encoding, **kwargs)
+    if compress == 'xz':
+        kwargs = {} if level is None or 'r' in mode else {'preset': level}
+        return lzma.open(path, mode, **encoding, **kwargs)
+    if compress == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package")
+        if 'r' in mode:
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        else:
+            compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+            stream = compressor.stream_writer(open(path, 'wb'), closefd=True)
+        if 'b' in mode:
+            return stream
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    raise ValueError(f"Unsupported compression format: {compress}")
+
+
+def escape_markdown_line(line):
+    """Backslash-escape a character that would start a Markdown block element."""
+    match = MARKDOWN_BLOCK_START.match(line)
+    if not match:
+        return line
+    indent, marker, number, delimiter = match.groups()
+    if marker:
+        return f"{indent}\\{marker}{line[match.end():]}"
+    return f"{indent}{number}\\{delimiter}{line[match.end():]}"
+
+
+def detect_compression(path):
+    """Return the compression format implied by a file's suffix, or None."""
+    suffix = Path(path).suffix
+    for compress, compress_suffix in COMPRESSION_SUFFIXES.items():
+        if suffix == compress_suffix:
+            return compress
+    return None
+
+
+class HtmlFragmentCache:
+    """Bounded LRU cache of cleaned HTML, keyed by a hash of the raw fragment."""
+
+    # Entries are (cleaned_html, plain_text) pairs since version 2
+    MANIFEST_VERSION = 2
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(html_content):
+        """Return the cache key for a raw HTML fragment."""
+        return hashlib.sha1(html_content.encode('utf-8')).hexdigest()
+
+    def get(self, key, usable=None):
+        """Return the cached value for a key and mark it as recently used, or None.
+
+        If usable is given, a cached value it rejects is counted as a miss.
+        """
+        value = self._entries.get(key)
+        if value is None or (usable is not None and not usable(value)):
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry when full."""
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return hit/miss/eviction counters and the hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def save(self, manifest_file):
+        """Write the cached entries to a JSON manifest, oldest first."""
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.MANIFEST_VERSION, 'entries': list(self._entries.items())}, f)
+
+    def load(self, manifest_file):
+        """Warm the cache from a manifest written by a previous run."""
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != self.MANIFEST_VERSION:
+            logging.warning(f"Ignoring HTML cache manifest {manifest_file} with unsupported version")
+            return 0
+        for key, value in manifest.get('entries', []):
+            self.put(key, tuple(value))
+        return len(self._entries)
+
+
+class ProgressReporter:
+    """Rate-limited progress output: a status line on a tty, JSON events otherwise.
+
+    Progress runs in two phases: 'converting' (input notes processed, with an
+    ETA from input bytes consumed) and 'writing' (rendered notes written out).
+    """
+
+    def __init__(self, total_files, total_bytes, stream=None, json_events=None, interval=None):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.stream = stream or sys.stderr
+        if json_events is None:
+            json_events = not (hasattr(self.stream, 'isatty') and self.stream.isatty())
+        self.json_events = json_events
+        self.interval = interval if interval is not None else (5.0 if json_events else 0.2)
+        self.phase = 'converting'
+        self.processed = 0
+        self.errors = 0
+        self.bytes_done = 0
+        self.written = 0
+        self.total_written = 0
+        self.start = time.monotonic()
+        self._phase_start = self.start
+        self._last_emit = None
+        self._line_active = False
+
+    def snapshot(self):
+        """Return the current counters with rates and ETA for the current phase."""
+        now = time.monotonic()
+        elapsed = max(now - self.start, 1e-9)
+        phase_elapsed = max(now - self._phase_start, 1e-9)
+        bytes_per_sec = self.bytes_done / elapsed
+        if self.phase == 'writing':
+            notes_per_sec = self.written / phase_elapsed
+            remaining = max(self.total_written - self.written, 0)
+            eta = remaining / notes_per_sec if notes_per_sec else None
+        else:
+            notes_per_sec = self.processed / phase_elapsed
+            remaining = max(self.total_bytes - self.bytes_done, 0)
+            eta = remaining / bytes_per_sec if bytes_per_sec else None
+        return {
+            'phase': self.phase,
+            'processed': self.processed,
+            'written': self.written,
+            'total_written': self.total_written,
+            'errors': self.errors,
+            'bytes': self.bytes_done,
+            'total_bytes': self.total_bytes,
+            'total_files': self.total_files,
+            'elapsed_sec': round(elapsed, 3),
+            'notes_per_sec': round(notes_per_sec, 1),
+            'mb_per_sec': round(bytes_per_sec / (1024 * 1024), 2),
+            'eta_sec': round(eta, 1) if eta is not None else None,
+        }
+
+    def update(self, processed, bytes_done, errors=0):
+        """Record input notes processed (including trashed and failed ones)."""
+        self.processed = processed
+        self.bytes_done = bytes_done
+        self.errors = errors
+        self._maybe_emit()
+
+    def start_writing(self, total_notes):
+        """Switch to the writing phase, expecting total_notes rendered notes."""
+        self.phase = 'writing'
+        self.total_written = total_notes
+        self.written = 0
+        self._phase_start = time.monotonic()
+        self._last_emit = None
+
+    def note_written(self):
+        """Record one rendered note written to disk."""
+        self.written += 1
+        self._maybe_emit()
+
+    def finish(self):
+        """Emit the final counters and end the status line."""
+        self._emit('done')
+        self.clear_line(keep=True)
+
+    def clear_line(self, keep=False):
+        """End the status line so other output starts on a clean line."""
+        if self.json_events or not self._line_active:
+            return
+        self.stream.write('\n' if keep else '\r\033[K')
+        self.stream.flush()
+        self._line_active = False
+        # Redraw on the next update instead of waiting for the interval
+        self._last_emit = None
+
+    def filter(self, record):
+        """Logging filter that clears the status line before a record is printed."""
+        self.clear_line()
+        return True
+
+    def attach(self):
+        """Clear the status line before any log record is emitted while attached."""
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(self)
+
+    def detach(self):
+        """Stop clearing the status line for log records."""
+        for handler in logging.getLogger().handlers:
+            handler.removeFilter(self)
+
+    def _maybe_emit(self):
+        now = time.monotonic()
+        if self._last_emit is None or now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self._emit('progress')
+
+    def _emit(self, event):
+        snapshot = self.snapshot()
+        if self.json_events:
+            self.stream.write(json.dumps(dict(event=event, **snapshot)) + '\n')
+        else:
+            eta = snapshot['eta_sec']
+            eta_str = time.strftime('%H:%M:%S', time.gmtime(eta)) if eta is not None else '--:--:--'
+            if self.phase == 'writing':
+                percent = 100.0 * self.written / self.total_written if self.total_written else 100.0
+                status = f"Writing {self.written}/{self.total_written} notes ({percent:.0f}%)"
+            else:
+                percent = 100.0 * self.bytes_done / self.total_bytes if self.total_bytes else 100.0
+                status = f"{self.processed} processed ({percent:.0f}%)"
+            self.stream.write(f"\r{status} | "
+                              f"{snapshot['notes_per_sec']:.1f} notes/s | "
+                              f"{snapshot['mb_per_sec']:.2f} MB/s | "
+                              f"{snapshot['errors']} errors | ETA {eta_str}\033[K")
+            self._line_active = True
+        self.stream.flush()
+
+
 class KeepToNotesConverter:
-    def __init__(self):
-        self.enex_header = '''<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE en-export SYSTEM "http://xml.evernote.com/pub/evernote-export3.dtd">
-<en-export export-date="{}" application="keep-to-notes" version="1.0">'''
-        
-        self.note_template = '''
-    <note>
-        <title>{}</title>
-        <content>
-            <![CDATA[<?xml version="1.0" encoding="UTF-8" standalone="no"?>
-<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">
-<en-note style="{}">
-{}
-</en-note>]]>
-        </content>
-        <created>{}</created>
-        <updated>{}</updated>
-        <note-attributes>
-            <source>Google Keep</source>
-            <source-url></source-url>
-            {}
-        </note-attributes>
-        {}
-    </note>'''
+    def __init__(self, html_cache_size=1024):
+        self.html_cache = HtmlFragmentCache(html_cache_size)
+        self.error_count = 0
+        self.bytes_read = 0
+        self.backends = {}
 
         # Color mapping from Google Keep to CSS
         self.color_map = {
@@ -61,9 +336,32 @@ class KeepToNotesConverter:
 
     def _clean_html(self, html_content):
         """Clean and format HTML content for Evernote compatibility."""
+        return self._clean_fragment(html_content)[0]
+
+    def _clean_fragment(self, html_content, with_text=False):
+        """Return (cleaned_html, plain_text) for a fragment, reusing cached results.
+
+        The plain text is only extracted when with_text is set; otherwise it is None.
+        """
         if not html_content:
-            return ""
-        
+            return "", ""
+        if self.html_cache.maxsize <= 0:
+            return self._clean_fragment_uncached(html_content, with_text)
+
+        key = self.html_cache.key(html_content)
+        # Entries cached without text are a miss when the text is needed
+        cleaned = self.html_cache.get(key, usable=self._has_text if with_text else None)
+        if cleaned is None:
+            cleaned = self._clean_fragment_uncached(html_content, with_text)
+            self.html_cache.put(key, cleaned)
+        return cleaned
+
+    @staticmethod
+    def _has_text(cleaned):
+        return cleaned[1] is not None
+
+    def _clean_fragment_uncached(self, html_content, with_text=False):
+        """Parse an HTML fragment once, returning its cleaned HTML and optionally its plain text."""
         soup = BeautifulSoup(html_content, 'lxml')
         
         # Remove any existing DOCTYPE or xml declarations
@@ -111,28 +409,413 @@ class KeepToNotesConverter:
                     new_soup = BeautifulSoup(new_text, 'lxml')
                     text_node.replace_with(new_soup)
 
-        return str(soup.body.decode_contents()) if soup.body else ""
+        if not soup.body:
+            return "", ""
+        cleaned_html = str(soup.body.decode_contents())
+        return cleaned_html, self._fragment_text(soup.body) if with_text else None
+
+    def _fragment_text(self, body):
+        """Flatten a cleaned fragment to Markdown-friendly text (mutates the tree)."""
+        # Escape the source text before adding Markdown markers of our own
+        for text_node in body.find_all(string=True):
+            escaped = '\n'.join(escape_markdown_line(line) for line in str(text_node).split('\n'))
+            if escaped != str(text_node):
+                text_node.replace_with(escaped)
+        for br in body.find_all('br'):
+            br.replace_with('\n')
+        for link in body.find_all('a'):
+            text, href = link.get_text(), link.get('href')
+            if href and href != text:
+                link.replace_with(f'[{text}]({href})')
+        for tag in body.find_all(['p', 'div', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
+            if tag.name.startswith('h'):
+                tag.insert(0, '#' * int(tag.name[1]) + ' ')
+            elif tag.name == 'li':
+                tag.insert(0, '- ')
+            tag.append('\n' if tag.name == 'li' else '\n\n')
+
+        lines = []
+        for line in body.get_text().split('\n'):
+            line = line.strip()
+            if line or (lines and lines[-1]):
+                lines.append(line)
+        return '\n'.join(lines).strip()
+
+    def _get_color_style(self, color):
+        """Get CSS styles for a note based on its color."""
+        color_info = self.color_map.get(color, self.color_map['DEFAULT'])
+        return f"background-color: {color_info['bg']}; color: {color_info['text']}; border: 1px solid {color_info['border']};"
+
+    def _parse_metadata(self, keep_note):
+        """Build a Note carrying only the Keep note's metadata, without content blocks."""
+        if 'listContent' in keep_note:
+            kind = 'list'
+        elif 'textContentHtml' in keep_note:
+            kind = 'html'
+        elif 'textContent' in keep_note:
+            kind = 'text'
+        else:
+            kind = None
+
+        return Note(
+            title=keep_note.get('title', 'Untitled'),
+            color=keep_note.get('color', 'DEFAULT'),
+            created=keep_note.get('createdTimestampUsec', 0),
+            updated=keep_note.get('userEditedTimestampUsec', 0),
+            pinned=keep_note.get('isPinned', False),
+            archived=keep_note.get('isArchived', False),
+            kind=kind,
+            hashtags=re.findall(r'#(\w+)', keep_note.get('textContent', '')),
+        )
+
+    def _parse_list_items(self, list_items):
+        """Convert Google Keep list items to checklist blocks, skipping empty items."""
+        blocks = []
+        for item in list_items:
+            item_text = item.get('text', '').strip()
+            if not item_text:
+                continue
+
+            # Use item's HTML content if available, otherwise use plain text
+            item_html = self._clean_html(item.get('textHtml', ''))
+            blocks.append(Block('check', html=item_html, text=item_text,
+                                checked=item.get('isChecked', False)))
+        return blocks
+
+    def parse_note(self, keep_note, with_text=False):
+        """Parse a Keep note once into the Note/Block representation shared by all backends.
+
+        HTML blocks only get plain text (for backends with needs_text) when with_text is set.
+        """
+        note = self._parse_metadata(keep_note)
+
+        if note.kind == 'list':
+            note.blocks = self._parse_list_items(keep_note['listContent'])
+        elif note.kind == 'html':
+            cleaned_html, text = self._clean_fragment(keep_note['textContentHtml'], with_text)
+            note.blocks = [Block('html', html=cleaned_html, text=text)]
+        elif note.kind == 'text':
+            note.blocks = [Block('paragraph', text=p) if p.strip() else Block('break')
+                           for p in keep_note['textContent'].split('\n')]
+        return note
+
+    def get_backend(self, name):
+        """Return the output backend registered under a format name."""
+        if name not in self.backends:
+            self.backends[name] = BACKENDS[name](self)
+        return self.backends[name]
 
     def _convert_list_content(self, list_items, color):
         """Convert Google Keep list items to a format that Apple Notes recognizes as a checklist."""
-        bg_color = self.color_map.get(color, self.color_map['DEFAULT'])['bg']
-        border_color = self.color_map.get(color, self.color_map['DEFAULT'])['border']
+        return self.get_backend('enex').render_list(self._parse_list_items(list_items), color)
+
+    def _get_note_content(self, keep_note):
+        """Extract and format note content based on type with enhanced styling."""
+        return self.get_backend('enex').render_content(self.parse_note(keep_note))
+
+    def _get_note_attributes(self, keep_note):
+        """Generate note attributes XML with enhanced metadata."""
+        return self.get_backend('enex').render_attributes(self._parse_metadata(keep_note))
+
+    def _get_tags(self, keep_note):
+        """Extract tags from note content and generate tags XML."""
+        return self.get_backend('enex').render_tags(self._parse_metadata(keep_note))
+
+    def convert_note(self, keep_note):
+        """Convert a single Google Keep note to Evernote format with enhanced styling."""
+        return self.get_backend('enex').render(self.parse_note(keep_note))
+
+    def _log_error(self, message):
+        """Log a conversion error and count it for progress reporting."""
+        self.error_count += 1
+        logging.error(message)
+
+    def _convert_keep_note(self, keep_note, source):
+        """Convert an already loaded Keep note, skipping it if trashed."""
+        if keep_note.get('isTrashed', False):
+            logging.debug(f"Skipping trashed note: {source}")
+            return None
+
+        note_content = self.convert_note(keep_note)
+        logging.debug(f"Successfully converted note: {keep_note.get('title', 'Untitled')}")
+        return note_content
+
+    def _load_json(self, input_file):
+        """Load a single (optionally compressed) Keep JSON file."""
+        with open_compressed(input_file, 'rt', detect_compression(input_file)) as f:
+            return json.load(f)
+
+    def convert_file(self, input_file):
+        """Convert a single (optionally compressed) Keep JSON file to ENEX format."""
+        try:
+            return self._convert_keep_note(self._load_json(input_file), input_file)
+        except Exception as e:
+            self._log_error(f"Error converting file {input_file}: {str(e)}")
+            return None
+
+    def _iter_tarball_notes(self, tar_file):
+        """Yield (source, keep_note) for every Keep JSON file inside a tarball."""
+        base = self.bytes_read
+        try:
+            with open(tar_file, 'rb') as raw, tarfile.open(fileobj=raw, mode='r|*') as tar:
+                for member in tar:
+                    # Track compressed bytes consumed so progress advances inside the tarball
+                    self.bytes_read = base + raw.tell()
+                    if not member.isfile() or not member.name.endswith('.json'):
+                        continue
+                    source = f"{tar_file}:{member.name}"
+                    try:
+                        keep_note = json.load(tar.extractfile(member))
+                    except Exception as e:
+                        self._log_error(f"Error converting file {source}: {str(e)}")
+                        continue
+                    # Multi-product Takeout archives contain JSON that is not a Keep note
+                    if not isinstance(keep_note, dict) or not any(
+                            field in keep_note for field in KEEP_NOTE_FIELDS):
+                        logging.debug(f"Skipping non-Keep JSON file: {source}")
+                        continue
+                    yield source, keep_note
+        except Exception as e:
+            self._log_error(f"Error reading tarball {tar_file}: {str(e)}")
+        self.bytes_read = base + os.path.getsize(tar_file)
+
+    @staticmethod
+    def _input_kind(name):
+        """Return 'tarball' or 'json' for supported input file names, else None."""
+        if name.endswith(TARBALL_SUFFIXES):
+            return 'tarball'
+        if name.endswith('.json') or any(
+                name.endswith('.json' + suffix) for suffix in COMPRESSION_SUFFIXES.values()):
+            return 'json'
+        return None
+
+    def count_inputs(self, input_dir):
+        """Cheaply count input files and their total size without reading them."""
+        file_count = 0
+        total_bytes = 0
+        if not os.path.isdir(input_dir):
+            return file_count, total_bytes
+        with os.scandir(input_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and self._input_kind(entry.name):
+                    file_count += 1
+                    total_bytes += entry.stat().st_size
+        return file_count, total_bytes
+
+    def iter_keep_notes(self, input_dir):
+        """Yield (source, keep_note) for every JSON file and tarball in a directory."""
+        self.bytes_read = 0
+        if not Path(input_dir).is_dir():
+            logging.warning(f"Input directory not found: {input_dir}")
+            return
+        for input_file in sorted(Path(input_dir).iterdir()):
+            kind = self._input_kind(input_file.name)
+            if kind == 'tarball':
+                yield from self._iter_tarball_notes(input_file)
+            elif kind == 'json':
+                try:
+                    keep_note = self._load_json(input_file)
+                except Exception as e:
+                    self._log_error(f"Error converting file {input_file}: {str(e)}")
+                    continue
+                finally:
+                    self.bytes_read += os.path.getsize(input_file)
+                yield input_file, keep_note
+
+    def _iter_parsed_notes(self, input_path, with_text=False):
+        """Yield a parsed Note (or None if trashed or broken) for every input note."""
+        for source, keep_note in self.iter_keep_notes(input_path):
+            if keep_note.get('isTrashed', False):
+                logging.debug(f"Skipping trashed note: {source}")
+                yield None
+                continue
+            try:
+                note = self.parse_note(keep_note, with_text)
+            except Exception as e:
+                self._log_error(f"Error converting file {source}: {str(e)}")
+                yield None
+                continue
+            logging.debug(f"Successfully converted note: {note.title}")
+            yield note
+
+    def convert_directory(self, input_dir, output_dir, split_files=False,
+                          compress=None, compress_level=None, progress=None, formats=None):
+        """Convert all Keep JSON files and tarballs in a directory to the requested formats.
+
+        Each note is parsed once and rendered by every backend in ``formats``
+        (default: ENEX only). If a ProgressReporter is given, it is updated
+        after every input note and every note written.
+        """
+        input_path = Path(input_dir)
+        output_path = Path(output_dir)
+        output_path.mkdir(parents=True, exist_ok=True)
+        
+        backends = [self.get_backend(name) for name in (formats or ['enex'])]
+        rendered = {backend.name: [] for backend in backends}
+        with_text = any(backend.needs_text for backend in backends)
+        note_count = 0
+        processed = 0
+        self.error_count = 0
+        
+        if progress:
+            progress.attach()
+        try:
+            for note in self._iter_parsed_notes(input_path, with_text):
+                processed += 1
+                if note is not None:
+                    try:
+                        outputs = [(backend.name, backend.render(note)) for backend in backends]
+                    except Exception as e:
+                        self._log_error(f"Error rendering note {note.title}: {str(e)}")
+                    else:
+                        for name, output in outputs:
+                            rendered[name].append(output)
+                        note_count += 1
+                if progress:
+                    progress.update(processed, self.bytes_read, self.error_count)
+            
+            if not note_count:
+                logging.warning("No valid notes found to convert")
+                return
+            
+            if progress:
+                progress.start_writing(note_count * len(backends))
+            for backend in backends:
+                backend.write(output_path, rendered[backend.name], split_files=split_files,
+                              compress=compress, compress_level=compress_level, progress=progress)
+        finally:
+            if progress:
+                progress.finish()
+                progress.detach()
+
+        stats = self.html_cache.stats()
+        if stats['hits'] or stats['misses']:
+            logging.info(f"HTML cache: {stats['hits']} hits, {stats['misses']} misses "
+                         f"({stats['hit_rate']:.1%} hit rate), {stats['evictions']} evictions")
+
+
+class Block:
+    """A unit of note content: 'html', 'paragraph', 'break' or checklist 'check'."""
+
+    __slots__ = ('kind', 'html', 'text', 'checked')
+
+    def __init__(self, kind, html='', text='', checked=False):
+        self.kind = kind
+        self.html = html
+        self.text = text
+        self.checked = checked
+
+
+class Note:
+    """Format-neutral representation of a Keep note, built once and rendered by each backend."""
+
+    __slots__ = ('title', 'color', 'created', 'updated', 'pinned', 'archived',
+                 'kind', 'hashtags', 'blocks')
+
+    def __init__(self, title, color='DEFAULT', created=0, updated=0, pinned=False,
+                 archived=False, kind=None, hashtags=None, blocks=None):
+        self.title = title
+        self.color = color
+        self.created = created
+        self.updated = updated
+        self.pinned = pinned
+        self.archived = archived
+        self.kind = kind
+        self.hashtags = hashtags or []
+        self.blocks = blocks or []
+
+    def type_tag(self):
+        """Return 'list' for checklists and 'note' for everything else."""
+        return 'list' if self.kind == 'list' else 'note'
+
+    def tags(self):
+        """Return the color tag (if any), the note type tag and lowercased hashtags."""
+        tags = []
+        if self.color != 'DEFAULT':
+            tags.append(f'color-{self.color.lower()}')
+        tags.append(self.type_tag())
+        tags.extend(tag.lower() for tag in self.hashtags)
+        return tags
+
+
+class OutputBackend(ABC):
+    """Renders parsed Notes to one output format and writes the results."""
+
+    name = None
+    # Whether render() needs the plain text of HTML blocks
+    needs_text = False
+
+    def __init__(self, converter):
+        self.converter = converter
+
+    @abstractmethod
+    def render(self, note):
+        """Render a single Note to this backend's per-note output."""
+
+    @abstractmethod
+    def write(self, output_path, rendered, split_files=False, compress=None, compress_level=None,
+              progress=None):
+        """Write the rendered notes under output_path."""
+
+    @staticmethod
+    def _unique_names(titles):
+        """Yield filesystem-safe, unique file stems for note titles."""
+        seen = {}
+        for title in titles:
+            stem = re.sub(r'[^\w\- ]+', '', title).strip()[:80] or 'Untitled'
+            count = seen.get(stem.lower(), 0)
+            seen[stem.lower()] = count + 1
+            yield stem if count == 0 else f"{stem} ({count + 1})"
+
+    @staticmethod
+    def _isoformat(usec_timestamp):
+        """Convert microsecond timestamp to a local ISO 8601 string."""
+        return datetime.fromtimestamp(usec_timestamp / 1000000).isoformat(timespec='seconds')
+
+
+class EnexBackend(OutputBackend):
+    """Evernote ENEX output styled for Apple Notes import."""
+
+    name = 'enex'
+
+    enex_header = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE en-export SYSTEM "http://xml.evernote.com/pub/evernote-export3.dtd">
+<en-export export-date="{}" application="keep-to-notes" version="1.0">'''
+        
+    note_template = '''
+    <note>
+        <title>{}</title>
+        <content>
+            <![CDATA[<?xml version="1.0" encoding="UTF-8" standalone="no"?>
+<!DOCTYPE en-note SYSTEM "http://xml.evernote.com/pub/enml2.dtd">
+<en-note style="{}">
+{}
+</en-note>]]>
+        </content>
+        <created>{}</created>
+        <updated>{}</updated>
+        <note-attributes>
+            <source>Google Keep</source>
+            <source-url></source-url>
+            {}
+        </note-attributes>
+        {}
+    </note>'''
+
+    def render_list(self, blocks, color, escape_text=False):
+        """Render checklist blocks in a format Apple Notes recognizes as a checklist."""
+        color_map = self.converter.color_map
+        bg_color = color_map.get(color, color_map['DEFAULT'])['bg']
+        border_color = color_map.get(color, color_map['DEFAULT'])['border']
         
         # Create a styled container for the checklist
         html = [f'<div style="background-color: {bg_color}; border: 1px solid {border_color}; border-radius: 8px; padding: 12px; margin-bottom: 15px;">']
         
         # Format that Apple Notes recognizes as a to-do list
-        for item in list_items:
-            checked = item.get('isChecked', False)
-            item_text = item.get('text', '').strip()
-            if not item_text:
-                continue
-            
-            # Use item's HTML content if available, otherwise use plain text
-            item_content = self._clean_html(item.get('textHtml', '')) or item_text
-            
-            # Format specifically for Apple Notes
-            if checked:
+        for block in blocks:
+            # Use the item's HTML content if available, otherwise its plain text
+            item_content = block.html or (escape(block.text) if escape_text else block.text)
+            if block.checked:
                 # Checked item
                 html.append(f'<div>☑ {item_content}</div>')
             else:
@@ -142,169 +825,398 @@ class KeepToNotesConverter:
         html.append('</div>')
         return '\n'.join(html)
 
-    def _get_color_style(self, color):
-        """Get CSS styles for a note based on its color."""
-        color_info = self.color_map.get(color, self.color_map['DEFAULT'])
-        return f"background-color: {color_info['bg']}; color: {color_info['text']}; border: 1px solid {color_info['border']};"
-
-    def _get_note_content(self, keep_note):
-        """Extract and format note content based on type with enhanced styling."""
-        content = []
-        color = keep_note.get('color', 'DEFAULT')
+    def render_content(self, note, escape_text=False):
+        """Format note content based on type with enhanced styling.
 
-        # Handle list content
-        if 'listContent' in keep_note:
-            content.append(self._convert_list_content(keep_note['listContent'], color))
-        
-        # Handle text content
-        elif 'textContentHtml' in keep_note:
-            cleaned_html = self._clean_html(keep_note['textContentHtml'])
-            content.append(f'<div style="padding: 8px;">{cleaned_html}</div>')
-        elif 'textContent' in keep_note:
+        ENEX keeps plain text as-is; escape_text HTML-escapes it for browser output.
+        """
+        if note.kind == 'list':
+            return self.render_list(note.blocks, note.color, escape_text)
+        if note.kind == 'html':
+            return f'<div style="padding: 8px;">{note.blocks[0].html}</div>'
+        if note.kind == 'text':
             # Convert plain text to paragraphs with proper spacing
-            paragraphs = keep_note['textContent'].split('\n')
-            formatted_text = []
-            for p in paragraphs:
-                if p.strip():
-                    formatted_text.append(f'<p style="margin-bottom: 0.8em;">{p}</p>')
-                else:
-                    formatted_text.append('<br/>')
-            content.append(f'<div style="padding: 8px;">{" ".join(formatted_text)}</div>')
-
-        return '\n'.join(content)
+            formatted_text = [f'<p style="margin-bottom: 0.8em;">{escape(block.text) if escape_text else block.text}</p>'
+                              if block.kind == 'paragraph' else '<br/>'
+                              for block in note.blocks]
+            return f'<div style="padding: 8px;">{" ".join(formatted_text)}</div>'
+        return ''
 
-    def _get_note_attributes(self, keep_note):
+    def render_attributes(self, note):
         """Generate note attributes XML with enhanced metadata."""
         attrs = []
         
         # Add note state information
-        if keep_note.get('isPinned', False):
+        if note.pinned:
             attrs.append('<pinned>true</pinned>')
-        if keep_note.get('isArchived', False):
+        if note.archived:
             attrs.append('<archived>true</archived>')
         
-        # Add color as a tag
-        color = keep_note.get('color', 'DEFAULT')
-        if color != 'DEFAULT':
-            attrs.append(f'<tag>color-{color.lower()}</tag>')
-        
-        # Add note type as a tag
-        if 'listContent' in keep_note:
-            attrs.append('<tag>list</tag>')
-        else:
-            attrs.append('<tag>note</tag>')
+        # Add color and note type as tags
+        if note.color != 'DEFAULT':
+            attrs.append(f'<tag>color-{note.color.lower()}</tag>')
+        attrs.append(f'<tag>{note.type_tag()}</tag>')
         
         return '\n            '.join(attrs)
 
-    def _get_tags(self, keep_note):
-        """Extract tags from note content and generate tags XML."""
-        tags = []
-        
-        # Add color as a tag
-        color = keep_note.get('color', 'DEFAULT')
-        if color != 'DEFAULT':
-            tags.append(f'<tag>color-{color.lower()}</tag>')
-        
-        # Add note type as a tag
-        if 'listContent' in keep_note:
-            tags.append('<tag>list</tag>')
-        else:
-            tags.append('<tag>note</tag>')
-        
-        # Extract hashtags from content
-        content = keep_note.get('textContent', '')
-        hashtags = re.findall(r'#(\w+)', content)
-        for tag in hashtags:
-            tags.append(f'<tag>{tag.lower()}</tag>')
-        
-        if tags:
-            return '\n        '.join(tags)
-        return ''
+    def render_tags(self, note):
+        """Generate tags XML from the note's color, type and hashtags."""
+        return '\n        '.join(f'<tag>{tag}</tag>' for tag in note.tags())
 
-    def convert_note(self, keep_note):
-        """Convert a single Google Keep note to Evernote format with enhanced styling."""
-        title = keep_note.get('title', 'Untitled')
-        color = keep_note.get('color', 'DEFAULT')
-        note_style = self._get_color_style(color)
-        content = self._get_note_content(keep_note)
-        created = self._convert_timestamp(keep_note.get('createdTimestampUsec', 0))
-        updated = self._convert_timestamp(keep_note.get('userEditedTimestampUsec', 0))
-        attributes = self._get_note_attributes(keep_note)
-        tags = self._get_tags(keep_note)
+    def render(self, note):
+        """Render a Note as an ENEX <note> element."""
+        note_style = self.converter._get_color_style(note.color)
+        content = self.render_content(note)
+        created = self.converter._convert_timestamp(note.created)
+        updated = self.converter._convert_timestamp(note.updated)
+        attributes = self.render_attributes(note)
+        tags = self.render_tags(note)
         
         tags_xml = f"<tags>\n        {tags}\n    </tags>" if tags else ""
         
-        return self.note_template.format(title, note_style, content, created, updated, attributes, tags_xml)
+        return self.note_template.format(note.title, note_style, content, created, updated, attributes, tags_xml)
 
-    def convert_file(self, input_file):
-        """Convert a single Keep JSON file to ENEX format."""
-        try:
-            with open(input_file, 'r', encoding='utf-8') as f:
-                keep_note = json.load(f)
-            
-            if keep_note.get('isTrashed', False):
-                logging.info(f"Skipping trashed note: {input_file}")
-                return None
-                
-            note_content = self.convert_note(keep_note)
-            logging.info(f"Successfully converted note: {keep_note.get('title', 'Untitled')}")
-            return note_content
-        except Exception as e:
-            logging.error(f"Error converting file {input_file}: {str(e)}")
-            return None
+    def write_file(self, output_file, notes, export_date, compress=None, compress_level=None,
+                   progress=None):
+        """Write notes to an ENEX file, compressing while streaming if requested."""
+        with open_compressed(output_file, 'wt', compress, compress_level) as f:
+            f.write(self.enex_header.format(export_date))
+            for note in notes:
+                f.write(note)
+                if progress:
+                    progress.note_written()
+            f.write("\n</en-export>")
 
-    def convert_directory(self, input_dir, output_dir, split_files=False):
-        """Convert all Keep JSON files in a directory to ENEX files."""
-        input_path = Path(input_dir)
-        output_path = Path(output_dir)
-        output_path.mkdir(parents=True, exist_ok=True)
-        
-        all_notes = []
-        file_count = 0
-        
-        for json_file in input_path.glob('*.json'):
-            note_content = self.convert_file(json_file)
-            if note_content:
-                all_notes.append(note_content)
-                file_count += 1
-        
-        if not all_notes:
-            logging.warning("No valid notes found to convert")
-            return
-        
-        # Create the ENEX file(s)
+    def write(self, output_path, rendered, split_files=False, compress=None, compress_level=None,
+              progress=None):
+        """Write one ENEX file, or files of 50 notes each when splitting."""
         export_date = datetime.now().strftime("%Y%m%dT%H%M%SZ")
+        suffix = ".enex" + COMPRESSION_SUFFIXES.get(compress, "")
         
-        if split_files and len(all_notes) > 50:
+        if split_files and len(rendered) > 50:
             # Split into multiple files if there are many notes
-            chunks = [all_notes[i:i + 50] for i in range(0, len(all_notes), 50)]
+            chunks = [rendered[i:i + 50] for i in range(0, len(rendered), 50)]
             for i, chunk in enumerate(chunks):
-                output_file = output_path / f"keep_notes_export_{i+1}.enex"
-                with open(output_file, 'w', encoding='utf-8') as f:
-                    f.write(self.enex_header.format(export_date))
-                    for note in chunk:
-                        f.write(note)
-                    f.write("\n</en-export>")
+                output_file = output_path / f"keep_notes_export_{i+1}{suffix}"
+                self.write_file(output_file, chunk, export_date, compress, compress_level, progress)
                 logging.info(f"Created file {output_file} with {len(chunk)} notes")
         else:
             # Create a single file
-            output_file = output_path / "keep_notes_export.enex"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(self.enex_header.format(export_date))
-                for note in all_notes:
-                    f.write(note)
-                f.write("\n</en-export>")
-            logging.info(f"Successfully converted {len(all_notes)} notes to {output_file}")
+            output_file = output_path / f"keep_notes_export{suffix}"
+            self.write_file(output_file, rendered, export_date, compress, compress_level, progress)
+            logging.info(f"Successfully converted {len(rendered)} notes to {output_file}")
+
+
+class MarkdownBackend(OutputBackend):
+    """One Markdown file per note, with YAML front matter for metadata."""
+
+    name = 'markdown'
+    needs_text = True
+
+    def render(self, note):
+        """Render a Note as (title, markdown_text)."""
+        lines = [
+            '---',
+            f'title: {json.dumps(note.title, ensure_ascii=False)}',
+            f'created: {self._isoformat(note.created)}',
+            f'updated: {self._isoformat(note.updated)}',
+        ]
+        if note.pinned:
+            lines.append('pinned: true')
+        if note.archived:
+            lines.append('archived: true')
+        lines.append(f"tags: [{', '.join(note.tags())}]")
+        lines.extend(['---', '', f'# {note.title}', ''])
+
+        body = []
+        for block in note.blocks:
+            if block.kind == 'check':
+                body.append(f"- [{'x' if block.checked else ' '}] {block.text}")
+            elif block.kind == 'break':
+                body.append('')
+            elif block.kind == 'paragraph':
+                body.append(escape_markdown_line(block.text))
+            else:
+                # HTML block text is escaped and marked up by _fragment_text
+                body.extend((block.text or '').split('\n'))
+        lines.extend(self._hard_breaks(body))
+
+        return note.title, '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _hard_breaks(lines):
+        """End lines followed by more paragraph text with a hard line break."""
+        result = []
+        for i, line in enumerate(lines):
+            following = lines[i + 1] if i + 1 < len(lines) else ''
+            if line and following and not line.lstrip().startswith('- '):
+                line += '  '
+            result.append(line)
+        return result
+
+    def write(self, output_path, rendered, split_files=False, compress=None, compress_level=None,
+              progress=None):
+        """Write each note to markdown/<title>.md."""
+        markdown_dir = output_path / 'markdown'
+        markdown_dir.mkdir(parents=True, exist_ok=True)
+        names = self._unique_names(title for title, _ in rendered)
+        for name, (_, text) in zip(names, rendered):
+            with open(markdown_dir / f"{name}.md", 'w', encoding='utf-8') as f:
+                f.write(text)
+            if progress:
+                progress.note_written()
+        logging.info(f"Created {len(rendered)} Markdown files in {markdown_dir}")
+
+
+class HtmlBackend(OutputBackend):
+    """Standalone HTML bundle: one page per note plus an index page."""
+
+    name = 'html'
+
+    page_template = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+</head>
+<body>
+<h1>{title}</h1>
+<div style="{style} border-radius: 8px; padding: 12px;">
+{content}
+</div>
+<p><small>Created {created} &middot; Updated {updated} &middot; {tags}</small></p>
+</body>
+</html>
+'''
+
+    index_template = '''<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Google Keep notes</title>
+</head>
+<body>
+<ul>
+{links}
+</ul>
+</body>
+</html>
+'''
+
+    def render(self, note):
+        """Render a Note as (title, html_page), reusing the Apple Notes styled markup."""
+        page = self.page_template.format(
+            title=escape(note.title),
+            style=self.converter._get_color_style(note.color),
+            content=self.converter.get_backend('enex').render_content(note, escape_text=True),
+            created=self._isoformat(note.created),
+            updated=self._isoformat(note.updated),
+            tags=escape(' '.join(f'#{tag}' for tag in note.tags())),
+        )
+        return note.title, page
+
+    def write(self, output_path, rendered, split_files=False, compress=None, compress_level=None,
+              progress=None):
+        """Write html/notes/<title>.html for each note and an html/index.html listing them."""
+        notes_dir = output_path / 'html' / 'notes'
+        notes_dir.mkdir(parents=True, exist_ok=True)
+        links = []
+        names = self._unique_names(title for title, _ in rendered)
+        for name, (title, page) in zip(names, rendered):
+            with open(notes_dir / f"{name}.html", 'w', encoding='utf-8') as f:
+                f.write(page)
+            if progress:
+                progress.note_written()
+            links.append(f'<li><a href="notes/{quote(name)}.html">{escape(title)}</a></li>')
+
+        index_file = output_path / 'html' / 'index.html'
+        with open(index_file, 'w', encoding='utf-8') as f:
+            f.write(self.index_template.format(links='\n'.join(links)))
+        logging.info(f"Created HTML bundle with {len(rendered)} notes in {index_file.parent}")
+
+
+# Output formats selectable with --format
+BACKENDS = {
+    'enex': EnexBackend,
+    'markdown': MarkdownBackend,
+    'html': HtmlBackend,
+}
+
+
+class EnexVerifier:
+    """Stream through generated ENEX files and cross-check them against the Keep sources."""
+
+    def __init__(self, converter=None):
+        self.converter = converter or KeepToNotesConverter()
+        self.enml_parser = etree.XMLParser(load_dtd=False, no_network=True,
+                                           resolve_entities=False, huge_tree=True)
+
+    @staticmethod
+    def _content_hash(text):
+        """Hash note text with whitespace normalized, so markup layout does not matter."""
+        return hashlib.sha256(' '.join(text.split()).encode('utf-8')).hexdigest()
+
+    def build_index(self, input_dir):
+        """Index the non-trashed source notes by the hash of their rendered text."""
+        index = {}
+        for source, keep_note in self.converter.iter_keep_notes(input_dir):
+            if keep_note.get('isTrashed', False):
+                continue
+            content = self.converter._get_note_content(keep_note)
+            text = lxml_html.fragment_fromstring(content, create_parent='div').text_content() if content else ''
+            entry = {
+                'source': str(source),
+                'title': keep_note.get('title', 'Untitled'),
+                'created': self.converter._convert_timestamp(keep_note.get('createdTimestampUsec', 0)),
+                'updated': self.converter._convert_timestamp(keep_note.get('userEditedTimestampUsec', 0)),
+            }
+            index.setdefault(self._content_hash(text), []).append(entry)
+        return index
+
+    def _iter_enex_files(self, output_dir):
+        """Return the (optionally compressed) ENEX files in a directory."""
+        suffixes = ('.enex',) + tuple('.enex' + suffix for suffix in COMPRESSION_SUFFIXES.values())
+        return [path for path in sorted(Path(output_dir).iterdir()) if path.name.endswith(suffixes)]
+
+    def _iter_enex_notes(self, enex_file):
+        """Yield (title, enml, created, updated) per note in constant memory."""
+        with open_compressed(enex_file, 'rb', detect_compression(enex_file)) as f:
+            for _, note in etree.iterparse(f, events=('end',), tag='note', huge_tree=True):
+                yield (note.findtext('title') or '',
+                       (note.findtext('content') or '').strip(),
+                       note.findtext('created') or '',
+                       note.findtext('updated') or '')
+                # Free the note and any siblings already processed
+                note.clear()
+                while note.getprevious() is not None:
+                    del note.getparent()[0]
+
+    def _match(self, index, content_hash, title):
+        """Pop the source entry for a note, preferring one with the same title."""
+        entries = index.get(content_hash)
+        if not entries:
+            return None
+        for i, entry in enumerate(entries):
+            if entry['title'] == title:
+                break
+        else:
+            i = 0
+        entry = entries.pop(i)
+        if not entries:
+            del index[content_hash]
+        return entry
+
+    def verify(self, input_dir, output_dir):
+        """Verify ENEX output against the source notes and return a summary dict."""
+        index = self.build_index(input_dir)
+        expected = sum(len(entries) for entries in index.values())
+        mismatches = []
+        note_count = 0
+        if not Path(output_dir).is_dir():
+            mismatches.append(f"Output directory not found: {output_dir}")
+            return {'notes': note_count, 'expected': expected, 'mismatches': mismatches}
+
+        for enex_file in self._iter_enex_files(output_dir):
+            position = 0
+            try:
+                for title, enml, created, updated in self._iter_enex_notes(enex_file):
+                    position += 1
+                    note_count += 1
+                    location = f"{enex_file.name} note {position} ({title!r})"
+                    try:
+                        en_note = etree.fromstring(enml.encode('utf-8'), self.enml_parser)
+                    except etree.XMLSyntaxError as e:
+                        mismatches.append(f"{location}: malformed ENML body: {e}")
+                        continue
+                    if en_note.tag != 'en-note':
+                        mismatches.append(f"{location}: ENML root is <{en_note.tag}>, expected <en-note>")
+                        continue
+
+                    entry = self._match(index, self._content_hash(''.join(en_note.itertext())), title)
+                    if entry is None:
+                        mismatches.append(f"{location}: no source note with matching content")
+                        continue
+                    for field, value in (('title', title), ('created', created), ('updated', updated)):
+                        if entry[field] != value:
+                            mismatches.append(f"{location}: {field} {value!r} does not match "
+                                              f"{entry[field]!r} from {entry['source']}")
+            except Exception as e:
+                mismatches.append(f"{enex_file.name}: malformed ENEX after note {position}: {e}")
+
+        for entries in index.values():
+            for entry in entries:
+                mismatches.append(f"{entry['source']}: note {entry['title']!r} missing from output")
+        if note_count != expected:
+            mismatches.append(f"Output contains {note_count} notes, expected {expected}")
+
+        return {'notes': note_count, 'expected': expected, 'mismatches': mismatches}
+
+
+def verify_main(argv):
+    parser = argparse.ArgumentParser(prog='keep_to_notes.py verify',
+                                     description='Verify generated ENEX files against the Keep JSON sources')
+    parser.add_argument('--input-dir', required=True, help='Directory containing Keep JSON files')
+    parser.add_argument('--output-dir', required=True, help='Directory containing the generated ENEX files')
+    args = parser.parse_args(argv)
+
+    result = EnexVerifier().verify(args.input_dir, args.output_dir)
+    for mismatch in result['mismatches']:
+        logging.error(mismatch)
+    if result['mismatches']:
+        logging.error(f"Verification failed with {len(result['mismatches'])} problem(s)")
+        raise SystemExit(1)
+    logging.info(f"Verified {result['notes']} notes")
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'verify':
+        return verify_main(sys.argv[2:])
+
     parser = argparse.ArgumentParser(description='Convert Google Keep JSON files to Evernote ENEX format')
     parser.add_argument('--input-dir', required=True, help='Directory containing Keep JSON files')
     parser.add_argument('--output-dir', required=True, help='Directory to save ENEX files')
-    parser.add_argument('--split', action='store_true', help='Split output into multiple files if there are many notes')
+    parser.add_argument('--split', action='store_true', help='Split ENEX output into multiple files if there are many notes')
+    parser.add_argument('--compress', choices=sorted(COMPRESSION_SUFFIXES), help='Compress ENEX output while writing it (ENEX only)')
+    parser.add_argument('--compress-level', type=int, help='Compression level passed to the selected compressor')
+    parser.add_argument('--html-cache-size', type=int, default=1024, help='Number of cleaned HTML fragments to cache (0 disables the cache)')
+    parser.add_argument('--html-cache-manifest', help='JSON file used to warm the HTML cache and saved after the run')
+    parser.add_argument('--progress', choices=['auto', 'line', 'json', 'none'], default='auto',
+                        help='Progress output: a status line on a tty, JSON events otherwise (auto)')
+    parser.add_argument('--verbose', action='store_true', help='Log every converted note')
+    parser.add_argument('--format', action='append', choices=sorted(BACKENDS), dest='formats',
+                        help='Output format; repeat to render several formats from one parse (default: enex)')
     args = parser.parse_args()
     
-    converter = KeepToNotesConverter()
-    converter.convert_directory(args.input_dir, args.output_dir, args.split)
+    if args.formats and 'enex' not in args.formats:
+        if args.compress:
+            parser.error("--compress only applies to ENEX output; add --format enex")
+        if args.split:
+            parser.error("--split only applies to ENEX output; add --format enex")
+    if args.compress == 'zstd' and zstandard is None:
+        parser.error("--compress zstd requires the 'zstandard' package")
+    if args.compress_level is not None:
+        if args.compress is None:
+            parser.error("--compress-level requires --compress")
+        min_level, max_level = COMPRESSION_LEVELS[args.compress]
+        if not min_level <= args.compress_level <= max_level:
+            parser.error(f"--compress-level for {args.compress} must be between {min_level} and {max_level}")
+    
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    
+    converter = KeepToNotesConverter(html_cache_size=args.html_cache_size)
+    if args.html_cache_manifest and os.path.exists(args.html_cache_manifest):
+        warmed = converter.html_cache.load(args.html_cache_manifest)
+        logging.info(f"Warmed HTML cache with {warmed} fragments from {args.html_cache_manifest}")
+    
+    progress = None
+    if args.progress != 'none':
+        file_count, total_bytes = converter.count_inputs(args.input_dir)
+        json_events = None if args.progress == 'auto' else args.progress == 'json'
+        progress = ProgressReporter(file_count, total_bytes, json_events=json_events)
+    converter.convert_directory(args.input_dir, args.output_dir, args.split,
+                                args.compress, args.compress_level, progress, args.formats)
+    if args.html_cache_manifest and args.html_cache_size > 0:
+        converter.html_cache.save(args.html_cache_manifest)
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
@@ -1,5 +1,6 @@
 import pytest
-from keep_to_notes import KeepToNotesConverter
+from keep_to_notes import (KeepToNotesConverter, EnexVerifier, HtmlFragmentCache, Note, OutputBackend,
+                           ProgressReporter, escape_markdown_line, open_compressed)
 from pathlib import Path
 import json
 import tempfile
@@ -9,6 +10,9 @@ import re
 import sys
 from unittest.mock import patch, MagicMock
 import logging
+import gzip
+import tarfile
+import io
 
 @pytest.fixture
 def converter():
@@ -389,7 +393,7 @@ def test_convert_file_nonexistent(converter, tmp_path):
     result = converter.convert_file(nonexistent_file)
     assert result is None
 
-@patch('logging.info')
+@patch('logging.debug')
 def test_convert_directory_with_logging(mock_logging, converter, tmp_path):
     # Create test input directory
     input_dir = tmp_path / "input_logging"
@@ -462,4 +466,498 @@ def test_main_module():
     import keep_to_notes
     
     # Just verify that the module has a main function
-    assert callable(keep_to_notes.main) 
\ No newline at end of file
+    assert callable(keep_to_notes.main) 
+def _write_sample_notes(input_dir, count):
+    for i in range(count):
+        note = {
+            "title": f"Note {i}",
+            "textContent": f"Content {i}",
+            "createdTimestampUsec": 1582955199253000,
+            "userEditedTimestampUsec": 1582955199253000
+        }
+        with open(input_dir / f"note{i}.json", 'w') as f:
+            json.dump(note, f)
+
+@pytest.mark.parametrize("compress,suffix", [("gzip", ".gz"), ("xz", ".xz")])
+def test_convert_directory_compressed_output(converter, tmp_path, compress, suffix):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 3)
+
+    converter.convert_directory(input_dir, output_dir, compress=compress)
+
+    output_file = output_dir / f"keep_notes_export.enex{suffix}"
+    assert output_file.exists()
+    assert not (output_dir / "keep_notes_export.enex").exists()
+
+    with open_compressed(output_file, 'rt', compress) as f:
+        content = f.read()
+    assert content.endswith("</en-export>")
+    for i in range(3):
+        assert f"<title>Note {i}</title>" in content
+
+def test_open_compressed_zstd_missing(tmp_path, monkeypatch):
+    import keep_to_notes
+    monkeypatch.setattr(keep_to_notes, 'zstandard', None)
+    with pytest.raises(RuntimeError):
+        open_compressed(tmp_path / "out.enex.zst", 'wt', 'zstd')
+
+def test_convert_file_gzipped_json(converter, tmp_path, sample_keep_note):
+    note_file = tmp_path / "note.json.gz"
+    with gzip.open(note_file, 'wt', encoding='utf-8') as f:
+        json.dump(sample_keep_note, f)
+
+    result = converter.convert_file(note_file)
+    assert '<title>Test Note</title>' in result
+
+def test_convert_directory_with_tarball(converter, tmp_path):
+    export_dir = tmp_path / "Takeout" / "Keep"
+    export_dir.mkdir(parents=True)
+    _write_sample_notes(export_dir, 2)
+    with open(export_dir / "trashed.json", 'w') as f:
+        json.dump({"title": "Trashed", "textContent": "gone", "isTrashed": True}, f)
+    (export_dir / "image.png").write_bytes(b"not a note")
+    drive_dir = tmp_path / "Takeout" / "Drive"
+    drive_dir.mkdir()
+    with open(drive_dir / "meta.json", 'w') as f:
+        json.dump({"id": "abc", "name": "Drive file"}, f)
+
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    with tarfile.open(input_dir / "takeout.tgz", 'w:gz') as tar:
+        tar.add(tmp_path / "Takeout", arcname="Takeout")
+
+    converter.convert_directory(input_dir, output_dir)
+
+    with open(output_dir / "keep_notes_export.enex", 'r') as f:
+        content = f.read()
+    assert "<title>Note 0</title>" in content
+    assert "<title>Note 1</title>" in content
+    assert "Trashed" not in content
+    assert content.count("<note>") == 2
+    assert EnexVerifier(converter).verify(input_dir, output_dir)['mismatches'] == []
+
+def test_main_function_with_compress(monkeypatch, tmp_path):
+    input_dir = tmp_path / "main_input_compress"
+    output_dir = tmp_path / "main_output_compress"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 1)
+
+    import keep_to_notes
+    monkeypatch.setattr('sys.argv', ['keep_to_notes.py',
+                                     '--input-dir', str(input_dir),
+                                     '--output-dir', str(output_dir),
+                                     '--compress', 'gzip',
+                                     '--compress-level', '9'])
+    keep_to_notes.main()
+
+    with gzip.open(output_dir / "keep_notes_export.enex.gz", 'rt', encoding='utf-8') as f:
+        assert "<title>Note 0</title>" in f.read()
+
+def test_verify_matches_converted_output(converter, tmp_path, sample_list_note):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 60)
+    with open(input_dir / "list.json", 'w') as f:
+        json.dump(sample_list_note, f)
+    with open(input_dir / "trashed.json", 'w') as f:
+        json.dump({"title": "Trashed", "textContent": "gone", "isTrashed": True}, f)
+
+    converter.convert_directory(input_dir, output_dir, split_files=True, compress='gzip')
+
+    result = EnexVerifier(converter).verify(input_dir, output_dir)
+    assert result['mismatches'] == []
+    assert result['notes'] == 61
+    assert result['expected'] == 61
+
+def test_verify_reports_mismatches(converter, tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 2)
+    converter.convert_directory(input_dir, output_dir)
+
+    # Rename a note and add a source note that was never converted
+    output_file = output_dir / "keep_notes_export.enex"
+    output_file.write_text(output_file.read_text().replace("<title>Note 0</title>", "<title>Renamed</title>"))
+    with open(input_dir / "late.json", 'w') as f:
+        json.dump({"title": "Late Note", "textContent": "Added later"}, f)
+
+    mismatches = EnexVerifier(converter).verify(input_dir, output_dir)['mismatches']
+    assert any("title 'Renamed' does not match 'Note 0'" in m for m in mismatches)
+    assert any("'Late Note' missing from output" in m for m in mismatches)
+    assert any("Output contains 2 notes, expected 3" in m for m in mismatches)
+
+def test_verify_reports_malformed_enml(converter, tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    with open(input_dir / "note.json", 'w') as f:
+        json.dump({"title": "Ampersand", "textContent": "Salt & pepper"}, f)
+    converter.convert_directory(input_dir, output_dir)
+
+    mismatches = EnexVerifier(converter).verify(input_dir, output_dir)['mismatches']
+    assert any("malformed ENML body" in m for m in mismatches)
+
+def test_main_verify_subcommand(monkeypatch, tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 1)
+
+    import keep_to_notes
+    monkeypatch.setattr('sys.argv', ['keep_to_notes.py', '--input-dir', str(input_dir),
+                                     '--output-dir', str(output_dir)])
+    keep_to_notes.main()
+    monkeypatch.setattr('sys.argv', ['keep_to_notes.py', 'verify', '--input-dir', str(input_dir),
+                                     '--output-dir', str(output_dir)])
+    keep_to_notes.main()
+
+    (output_dir / "keep_notes_export.enex").write_text("<en-export><note><title>Broken")
+    with pytest.raises(SystemExit):
+        keep_to_notes.main()
+
+def test_html_fragment_cache_eviction():
+    cache = HtmlFragmentCache(maxsize=2)
+    cache.put('a', 'A')
+    cache.put('b', 'B')
+    assert cache.get('a') == 'A'  # 'a' becomes most recently used
+    cache.put('c', 'C')           # evicts 'b'
+    assert cache.get('b') is None
+    assert cache.get('c') == 'C'
+
+    stats = cache.stats()
+    assert stats['size'] == 2
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+    assert stats['hit_rate'] == pytest.approx(2 / 3)
+
+def test_clean_html_uses_cache(converter):
+    html = '<p style="font-size: 12pt; color: blue;">milk</p>'
+    with patch.object(converter, '_clean_fragment_uncached', wraps=converter._clean_fragment_uncached) as uncached:
+        first = converter._clean_html(html)
+        second = converter._clean_html(html)
+    assert first == second
+    assert uncached.call_count == 1
+    assert converter.html_cache.stats()['hits'] == 1
+
+def test_clean_html_cache_disabled():
+    converter = KeepToNotesConverter(html_cache_size=0)
+    converter._clean_html('<p>milk</p>')
+    converter._clean_html('<p>milk</p>')
+    assert len(converter.html_cache) == 0
+    assert converter.html_cache.stats()['hits'] == 0
+
+def test_html_cache_manifest_round_trip(converter, tmp_path):
+    converter._clean_html('<p>eggs</p>')
+    manifest = tmp_path / "html_cache.json"
+    converter.html_cache.save(manifest)
+
+    warmed = KeepToNotesConverter()
+    assert warmed.html_cache.load(manifest) == 1
+    with patch.object(warmed, '_clean_fragment_uncached') as uncached:
+        assert warmed._clean_html('<p>eggs</p>') == converter._clean_html('<p>eggs</p>')
+    uncached.assert_not_called()
+
+def test_main_function_with_html_cache_manifest(monkeypatch, tmp_path):
+    input_dir = tmp_path / "main_input_cache"
+    output_dir = tmp_path / "main_output_cache"
+    input_dir.mkdir()
+    with open(input_dir / "note.json", 'w') as f:
+        json.dump({"title": "Cached", "textContentHtml": "<p>Cached body</p>"}, f)
+    manifest = tmp_path / "html_cache.json"
+
+    import keep_to_notes
+    monkeypatch.setattr('sys.argv', ['keep_to_notes.py',
+                                     '--input-dir', str(input_dir),
+                                     '--output-dir', str(output_dir),
+                                     '--html-cache-manifest', str(manifest)])
+    keep_to_notes.main()
+    assert manifest.exists()
+
+    # Second run warms from the manifest, so the fragment is never re-parsed
+    with patch.object(keep_to_notes.KeepToNotesConverter, '_clean_fragment_uncached') as uncached, \
+            patch('logging.info') as mock_logging:
+        keep_to_notes.main()
+    uncached.assert_not_called()
+    mock_logging.assert_any_call(f"Warmed HTML cache with 1 fragments from {manifest}")
+    mock_logging.assert_any_call("HTML cache: 1 hits, 0 misses (100.0% hit rate), 0 evictions")
+
+def test_count_inputs(converter, tmp_path):
+    _write_sample_notes(tmp_path, 3)
+    (tmp_path / "export.tgz").write_bytes(b"x" * 10)
+    (tmp_path / "image.png").write_bytes(b"x" * 100)
+
+    file_count, total_bytes = converter.count_inputs(tmp_path)
+    assert file_count == 4
+    assert total_bytes == sum(os.path.getsize(tmp_path / f"note{i}.json") for i in range(3)) + 10
+
+def test_progress_reporter_json_events():
+    stream = io.StringIO()
+    progress = ProgressReporter(total_files=2, total_bytes=200, stream=stream, interval=3600)
+    progress.update(1, 100, errors=0)
+    progress.update(2, 200, errors=1)  # Rate limited, not emitted
+    progress.finish()
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [e['event'] for e in events] == ['progress', 'done']
+    assert events[0]['processed'] == 1
+    assert events[1]['processed'] == 2
+    assert events[1]['errors'] == 1
+    assert events[1]['eta_sec'] == 0
+
+def test_progress_reporter_status_line():
+    stream = io.StringIO()
+    progress = ProgressReporter(total_files=1, total_bytes=100, stream=stream, json_events=False)
+    progress.update(3, 50, errors=2)
+    progress.finish()
+
+    output = stream.getvalue()
+    assert output.startswith('\r3 processed (50%)')
+    assert '2 errors' in output
+    assert 'notes/s' in output and 'MB/s' in output and 'ETA' in output
+    assert output.endswith('\n')
+
+def test_convert_directory_with_progress(converter, tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 3)
+    (input_dir / "bad.json").write_text("not json")
+
+    stream = io.StringIO()
+    file_count, total_bytes = converter.count_inputs(input_dir)
+    progress = ProgressReporter(file_count, total_bytes, stream=stream, json_events=True, interval=0)
+    converter.convert_directory(input_dir, output_dir, progress=progress)
+
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert events[-1]['event'] == 'done'
+    assert events[-1]['processed'] == 3
+    assert events[-1]['errors'] == 1
+    assert events[-1]['bytes'] == total_bytes
+    assert events[-1]['phase'] == 'writing'
+    assert events[-1]['written'] == events[-1]['total_written'] == 3
+    assert any(e['phase'] == 'converting' for e in events)
+
+def test_progress_status_line_cleared_before_logging(converter, tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 2)
+    (input_dir / "zz_bad.json").write_text("not json")
+
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    logging.getLogger().addHandler(handler)
+    try:
+        progress = ProgressReporter(3, 100, stream=stream, json_events=False, interval=0)
+        converter.convert_directory(input_dir, tmp_path / "output", progress=progress)
+    finally:
+        logging.getLogger().removeHandler(handler)
+
+    output = stream.getvalue()
+    error_at = output.index("Error converting file")
+    # The status line is erased before the error is logged
+    assert output[:error_at].endswith('\r\033[K')
+    assert 'Writing 2/2 notes (100%)' in output
+    assert not handler.filters
+
+def test_parse_note_list(converter, sample_list_note):
+    note = converter.parse_note(sample_list_note)
+    assert isinstance(note, Note)
+    assert note.kind == 'list'
+    assert [(b.kind, b.text, b.checked) for b in note.blocks] == [
+        ('check', 'Item 1', False), ('check', 'Item 2', True)]
+    assert note.tags() == ['list']
+    assert not hasattr(note, '__dict__')
+
+def test_parse_note_text_blocks(converter):
+    note = converter.parse_note({"title": "Text", "textContent": "Line 1\n\nLine 3 #Todo", "color": "BLUE"})
+    assert [b.kind for b in note.blocks] == ['paragraph', 'break', 'paragraph']
+    assert note.tags() == ['color-blue', 'note', 'todo']
+
+def test_parse_note_html_text(converter):
+    note = converter.parse_note({"title": "Html", "textContentHtml": "<h2>Plan</h2><p>Read <b>this</b> first</p><p>https://example.com</p>"},
+                                 with_text=True)
+    block = note.blocks[0]
+    assert block.kind == 'html'
+    assert 'margin-top: 1.2em' in block.html
+    assert block.text == "## Plan\n\nRead this first\n\nhttps://example.com"
+
+def test_markdown_backend_render(converter, sample_list_note):
+    sample_list_note["isPinned"] = True
+    title, text = converter.get_backend('markdown').render(converter.parse_note(sample_list_note))
+    assert title == "Test List"
+    assert text.startswith('---\ntitle: "Test List"\n')
+    assert 'pinned: true' in text
+    assert 'tags: [list]' in text
+    assert '# Test List' in text
+    assert '- [ ] Item 1\n- [x] Item 2' in text
+
+def test_convert_directory_multiple_formats_parses_once(converter, tmp_path):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 2)
+    with open(input_dir / "dup.json", 'w') as f:
+        json.dump({"title": "Note 0", "textContentHtml": "<p>Duplicate title</p>"}, f)
+
+    with patch.object(converter, 'parse_note', wraps=converter.parse_note) as parse_note:
+        converter.convert_directory(input_dir, output_dir, formats=['enex', 'markdown', 'html'])
+    assert parse_note.call_count == 3
+
+    assert (output_dir / "keep_notes_export.enex").exists()
+    assert (output_dir / "markdown" / "Note 1.md").read_text().count("Content 1") == 1
+    assert (output_dir / "markdown" / "Note 0 (2).md").exists()
+
+    index = (output_dir / "html" / "index.html").read_text()
+    assert '<a href="notes/Note%200%20%282%29.html">Note 0</a>' in index
+    page = (output_dir / "html" / "notes" / "Note 1.html").read_text()
+    assert '<title>Note 1</title>' in page
+    assert 'Content 1' in page
+
+def test_main_function_with_formats(monkeypatch, tmp_path):
+    input_dir = tmp_path / "main_input_formats"
+    output_dir = tmp_path / "main_output_formats"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 1)
+
+    import keep_to_notes
+    monkeypatch.setattr('sys.argv', ['keep_to_notes.py',
+                                     '--input-dir', str(input_dir),
+                                     '--output-dir', str(output_dir),
+                                     '--format', 'markdown'])
+    keep_to_notes.main()
+
+    assert (output_dir / "markdown" / "Note 0.md").exists()
+    assert not (output_dir / "keep_notes_export.enex").exists()
+
+@pytest.mark.parametrize("compress,level", [("gzip", 12), ("xz", 10), (None, 5)])
+def test_main_rejects_invalid_compress_level(monkeypatch, tmp_path, compress, level):
+    input_dir = tmp_path / "input"
+    output_dir = tmp_path / "output"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 1)
+
+    import keep_to_notes
+    argv = ['keep_to_notes.py', '--input-dir', str(input_dir), '--output-dir', str(output_dir),
+            '--compress-level', str(level)]
+    if compress:
+        argv += ['--compress', compress]
+    monkeypatch.setattr('sys.argv', argv)
+    with pytest.raises(SystemExit):
+        keep_to_notes.main()
+    assert not output_dir.exists()
+
+def test_convert_directory_missing_input_dir(converter, tmp_path):
+    output_dir = tmp_path / "output"
+    assert converter.count_inputs(tmp_path / "missing") == (0, 0)
+    converter.convert_directory(tmp_path / "missing", output_dir)
+    assert not (output_dir / "keep_notes_export.enex").exists()
+
+def test_main_verify_missing_output_dir(monkeypatch, tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 1)
+
+    import keep_to_notes
+    monkeypatch.setattr('sys.argv', ['keep_to_notes.py', 'verify', '--input-dir', str(input_dir),
+                                     '--output-dir', str(tmp_path / "missing")])
+    with pytest.raises(SystemExit) as excinfo:
+        keep_to_notes.main()
+    assert excinfo.value.code == 1
+
+def test_parse_note_skips_text_by_default(converter):
+    note_json = {"title": "Html", "textContentHtml": "<p>Body</p>"}
+    with patch.object(converter, '_fragment_text', wraps=converter._fragment_text) as fragment_text:
+        assert converter.parse_note(note_json).blocks[0].text is None
+        fragment_text.assert_not_called()
+        # A cached entry without text is upgraded when text is needed
+        assert converter.parse_note(note_json, with_text=True).blocks[0].text == "Body"
+        assert fragment_text.call_count == 1
+
+def test_convert_directory_enex_only_skips_text(converter, tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    with open(input_dir / "note.json", 'w') as f:
+        json.dump({"title": "Html", "textContentHtml": "<p>Body</p>"}, f)
+    with patch.object(converter, '_fragment_text') as fragment_text:
+        converter.convert_directory(input_dir, tmp_path / "output")
+    fragment_text.assert_not_called()
+
+@pytest.mark.parametrize("line,expected", [
+    ("# heading", "\\# heading"),
+    ("- item", "\\- item"),
+    ("  > quote", "  \\> quote"),
+    ("1. first", "1\\. first"),
+    ("2) second", "2\\) second"),
+    ("1990. A good year", "1990\\. A good year"),
+    ("plain #tag", "plain #tag"),
+    ("10 items", "10 items"),
+])
+def test_escape_markdown_line(line, expected):
+    assert escape_markdown_line(line) == expected
+
+def test_markdown_backend_line_breaks_and_escaping(converter):
+    note = converter.parse_note({"title": "Text", "textContent": "Line 1\n# not a heading\n\n1. not a list\nhttp://a.b"})
+    _, text = converter.get_backend('markdown').render(note)
+    body = text.split('# Text\n\n', 1)[1]
+    assert body == "Line 1  \n\\# not a heading\n\n1\\. not a list  \nhttp://a.b\n"
+
+def test_markdown_backend_escapes_html_text(converter):
+    note = converter.parse_note({"title": "Html", "textContentHtml": "<h1>Title</h1><p>- dash<br>second line</p>"},
+                                with_text=True)
+    _, text = converter.get_backend('markdown').render(note)
+    assert "# Title\n\n\\- dash  \nsecond line\n" in text
+
+def test_output_backend_is_abstract(converter):
+    class IncompleteBackend(OutputBackend):
+        name = 'incomplete'
+
+        def render(self, note):
+            return note.title
+
+    with pytest.raises(TypeError):
+        IncompleteBackend(converter)
+
+@pytest.mark.parametrize("extra", [['--compress', 'xz'], ['--split']])
+def test_main_rejects_enex_options_without_enex(monkeypatch, tmp_path, extra):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    _write_sample_notes(input_dir, 1)
+
+    import keep_to_notes
+    monkeypatch.setattr('sys.argv', ['keep_to_notes.py', '--input-dir', str(input_dir),
+                                     '--output-dir', str(tmp_path / "output"),
+                                     '--format', 'markdown'] + extra)
+    with pytest.raises(SystemExit):
+        keep_to_notes.main()
+
+def test_html_backend_escapes_plain_text(converter):
+    html_backend = converter.get_backend('html')
+    _, page = html_backend.render(converter.parse_note({"title": "Text", "textContent": "if a<b then x & y"}))
+    assert 'if a&lt;b then x &amp; y' in page
+    assert 'a<b' not in page
+
+    _, page = html_backend.render(converter.parse_note(
+        {"title": "List", "listContent": [{"text": "<script>alert(1)</script> & more"}]}))
+    assert '☐ &lt;script&gt;alert(1)&lt;/script&gt; &amp; more' in page
+    assert '<script>' not in page
+
+def test_clean_fragment_counts_textless_entry_as_miss(converter, tmp_path):
+    converter._clean_fragment('<p>Body</p>')
+    manifest = tmp_path / "html_cache.json"
+    converter.html_cache.save(manifest)
+
+    warmed = KeepToNotesConverter()
+    warmed.html_cache.load(manifest)
+    with patch.object(warmed, '_clean_fragment_uncached', wraps=warmed._clean_fragment_uncached) as uncached:
+        assert warmed._clean_fragment('<p>Body</p>', with_text=True)[1] == "Body"
+        assert warmed._clean_fragment('<p>Body</p>', with_text=True)[1] == "Body"
+    assert uncached.call_count == 1
+    stats = warmed.html_cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+    assert stats['hit_rate'] == 0.5